@@ -1,53 +1,200 @@
-from flask import Flask, send_from_directory, jsonify, request
+from fastapi import FastAPI
+from fastapi.responses import Response
+from fastapi.staticfiles import StaticFiles
+import argparse
+import asyncio
+import multiprocessing
 import os
+import shutil
+import socket
 import sys
+import tempfile
 import threading
 import webbrowser
-import time
-from launcher import launch_app, get_app_status, stop_app
+import orjson
+import uvicorn
+import launcher
 
-app = Flask(__name__)
+HOST = '127.0.0.1'
+PORT = 5000
 
-# Serve static files (HTML, CSS, JS)
-@app.route('/')
-def index():
-    return send_from_directory(os.getcwd(), 'index.html')
+# Where the API handlers send launcher calls: this process's launcher by default,
+# or a LauncherClient talking to the supervisor in a multi-worker server
+launcher_backend = launcher
 
-@app.route('/<path:filename>')
-def static_files(filename):
-    return send_from_directory(os.getcwd(), filename)
+# Directory the static files are served from, resolved once at import. When running
+# as a PyInstaller bundle the files are extracted to sys._MEIPASS.
+STATIC_ROOT = os.path.abspath(sys._MEIPASS if getattr(sys, '_MEIPASS', False) else os.getcwd())
+
+# Directories under STATIC_ROOT that never hold files the UI serves
+SKIPPED_STATIC_DIRS = {'node_modules', '__pycache__'}
+
+class PrecomputedStaticFiles(StaticFiles):
+    # Walk the static root once and serve only the paths found there, so each
+    # request is a dict lookup instead of realpath()/stat() probing. The walk
+    # happens on the first request, so processes that never serve static files
+    # (the multi-worker supervisor) don't pay for it. Files added after that
+    # are not served until the server is restarted.
+    def __init__(self, directory, **kwargs):
+        super().__init__(directory=directory, **kwargs)
+        self.root = directory
+        self.known_paths = None
+        self._build_lock = threading.Lock()
+
+    def _build_known_paths(self):
+        known_paths = {}
+        real_root = os.path.join(os.path.realpath(self.root), '')
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            # Never expose VCS metadata or other dot-directories, and skip
+            # dependency/cache trees that would make the walk huge
+            dirnames[:] = [name for name in dirnames
+                           if not name.startswith('.') and name not in SKIPPED_STATIC_DIRS]
+            rel_dir = os.path.relpath(dirpath, self.root)
+            known_paths[rel_dir] = dirpath
+            for name in filenames:
+                full_path = os.path.join(dirpath, name)
+                # os.walk doesn't follow directory symlinks, so only a symlinked
+                # file can point outside the root, as StaticFiles also refuses
+                if os.path.islink(full_path) and not os.path.realpath(full_path).startswith(real_root):
+                    continue
+                known_paths[os.path.normpath(os.path.join(rel_dir, name))] = full_path
+        return known_paths
+
+    def lookup_path(self, path):
+        if self.known_paths is None:
+            # StaticFiles calls this from worker threads
+            with self._build_lock:
+                if self.known_paths is None:
+                    self.known_paths = self._build_known_paths()
+        full_path = self.known_paths.get(os.path.normpath(path))
+        if full_path is None:
+            return "", None
+        try:
+            return full_path, os.stat(full_path)
+        except OSError:
+            return "", None
+
+class ORJSONResponse(Response):
+    # JSON response rendered straight to bytes by orjson (FastAPI's own
+    # ORJSONResponse is deprecated in newer releases)
+    media_type = 'application/json'
+
+    def render(self, content):
+        return orjson.dumps(content)
+
+# ASGI entry point. The handlers return ORJSONResponse directly, which skips
+# FastAPI's response validation and encoding; the interactive docs are disabled
+# so the only routes are the API below and the static files.
+asgi_app = FastAPI(default_response_class=ORJSONResponse, openapi_url=None, docs_url=None, redoc_url=None)
 
 # API to launch an application
-@app.route('/api/launch/<app_name>')
-def api_launch(app_name):
-    result = launch_app(app_name)
-    return jsonify(result)
+@asgi_app.get('/api/launch/{app_name}')
+async def api_launch(app_name: str):
+    return ORJSONResponse(await launcher_backend.launch_app(app_name))
 
 # API to get application status
-@app.route('/api/status/<app_name>')
-def api_status(app_name):
-    status = get_app_status(app_name)
-    return jsonify(status)
+@asgi_app.get('/api/status/{app_name}')
+async def api_status(app_name: str):
+    return ORJSONResponse(await launcher_backend.get_app_status(app_name))
 
 # API to stop an application (optional, for future UI feature)
-@app.route('/api/stop/<app_name>')
-def api_stop(app_name):
-    result = stop_app(app_name)
-    return jsonify(result)
+@asgi_app.get('/api/stop/{app_name}')
+async def api_stop(app_name: str):
+    return ORJSONResponse(await launcher_backend.stop_app(app_name))
+
+# Static files (HTML, CSS, JS) from STATIC_ROOT, with '/' serving index.html.
+# Mounted last so the API routes take precedence.
+asgi_app.mount('/', PrecomputedStaticFiles(directory=STATIC_ROOT, html=True))
+
+def open_browser_later():
+    # Open the browser from the running event loop once the server has had a moment to start up
+    asyncio.get_running_loop().call_later(1.0, webbrowser.open_new, f"http://{HOST}:{PORT}/")
+
+async def serve(server):
+    open_browser_later()
+    await server.serve()
 
-def open_browser():
-    # Give the server a moment to start up
-    time.sleep(1)
-    webbrowser.open_new("http://127.0.0.1:5000/") # Flask default port
+def make_config():
+    # "auto" picks uvloop/httptools (C-level HTTP parsing) when uvicorn[standard]
+    # is installed and falls back to asyncio/h11 otherwise
+    return uvicorn.Config(asgi_app, host=HOST, port=PORT, loop='auto', http='auto')
+
+def bind_reuseport_socket():
+    # Every worker binds its own listening socket to the same port; the kernel
+    # spreads incoming connections across them. SO_REUSEADDR avoids EADDRINUSE
+    # from TIME_WAIT connections when the server restarts.
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((HOST, PORT))
+    return sock
+
+def run_worker(control_path):
+    global launcher_backend
+    launcher_backend = launcher.LauncherClient(control_path)
+
+    config = make_config()
+    sock = bind_reuseport_socket()
+    try:
+        with asyncio.Runner(loop_factory=config.get_loop_factory()) as runner:
+            runner.run(uvicorn.Server(config).serve(sockets=[sock]))
+    except KeyboardInterrupt:
+        pass # Ctrl+C reaches every worker; uvicorn re-raises it after shutting down
+
+async def supervise(workers, control_path):
+    # The supervisor owns the launched apps and serves them to the workers
+    control_server = await launcher.serve_control(control_path)
+
+    # Spawn rather than fork: this process already has an event loop and threads
+    context = multiprocessing.get_context('spawn')
+    processes = [context.Process(target=run_worker, args=(control_path,)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    open_browser_later()
+
+    try:
+        # Run until every worker has exited (they handle Ctrl+C themselves)
+        for process in processes:
+            await asyncio.to_thread(process.join)
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        control_server.close()
+
+def run_multi_worker(workers):
+    control_dir = tempfile.mkdtemp(prefix='terrafusion-')
+    try:
+        with asyncio.Runner(loop_factory=make_config().get_loop_factory()) as runner:
+            runner.run(supervise(workers, os.path.join(control_dir, 'launcher.sock')))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        shutil.rmtree(control_dir, ignore_errors=True)
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()
+
+    parser = argparse.ArgumentParser(description='Serve the TerraFusion launcher UI and API.')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of server processes sharing the port via SO_REUSEPORT (0 = one per CPU)')
+    args = parser.parse_args()
+    workers = args.workers or os.cpu_count() or 1
+    if workers > 1 and not (hasattr(socket, 'SO_REUSEPORT') and hasattr(socket, 'AF_UNIX')):
+        print('Multiple workers need SO_REUSEPORT and Unix sockets; running a single worker.', file=sys.stderr)
+        workers = 1
+
     # Determine if running as a PyInstaller bundle
     if getattr(sys, '_MEIPASS', False):
         # Running as a bundled executable, change working directory to temp dir where files are extracted
         os.chdir(sys._MEIPASS)
 
-    # Open browser in a separate thread to not block Flask server
-    threading.Thread(target=open_browser).start()
-    
-    # Run the Flask app
-    app.run(host='127.0.0.1', port=5000) 
\ No newline at end of file
+    if workers == 1:
+        config = make_config()
+        try:
+            with asyncio.Runner(loop_factory=config.get_loop_factory()) as runner:
+                runner.run(serve(uvicorn.Server(config)))
+        except KeyboardInterrupt:
+            pass # uvicorn re-raises Ctrl+C after its graceful shutdown
+    else:
+        run_multi_worker(workers)
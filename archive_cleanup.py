@@ -1,10 +1,17 @@
 import os
+import sys
+import stat
+import errno
 import shutil
+import argparse
 import datetime
 
+COPY_CHUNK_SIZE = 1 << 20
+
 class CodeArchiver:
     def __init__(self, workspace_root, archive_root="archive"):
         self.workspace_root = os.path.abspath(workspace_root)
+        self._workspace_prefix = os.path.join(self.workspace_root, "")
         self.archive_root = os.path.join(self.workspace_root, archive_root)
         os.makedirs(self.archive_root, exist_ok=True)
 
@@ -12,48 +19,189 @@ class CodeArchiver:
         timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
         return os.path.join(self.archive_root, timestamp)
 
-    def archive_items(self, items_to_archive, reason="General cleanup"):
+    def _copy_file(self, src, dst):
+        # Copy in-kernel so file data never passes through Python buffers
+        if hasattr(os, "copy_file_range"):
+            with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+                in_fd, out_fd = fsrc.fileno(), fdst.fileno()
+                try:
+                    while os.copy_file_range(in_fd, out_fd, COPY_CHUNK_SIZE):
+                        pass
+                    copied = True
+                except OSError as e:
+                    # Older kernels and many filesystem pairs refuse cross-device copies
+                    if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                        raise
+                    copied = False
+            if copied:
+                shutil.copystat(src, dst)
+                return
+        # shutil.copy2 still uses sendfile()/fcopyfile() where available
+        shutil.copy2(src, dst)
+
+    def _copy_entry(self, src, dst, is_link):
+        if is_link:
+            os.symlink(os.readlink(src), dst)
+        else:
+            self._copy_file(src, dst)
+
+    def _fsync_dir(self, path):
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            return # Directories can't be opened on this platform
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def _copy_tree(self, src, dst):
+        # scandir hands back the entry types with the listing, so nothing is re-stated
+        os.mkdir(dst)
+        with os.scandir(src) as entries:
+            for entry in entries:
+                target = os.path.join(dst, entry.name)
+                if entry.is_dir(follow_symlinks=False):
+                    self._copy_tree(entry.path, target)
+                else:
+                    self._copy_entry(entry.path, target, entry.is_symlink())
+        shutil.copystat(src, dst)
+
+    def _move_item(self, src, dst, src_stat, dst_dev):
+        # Same filesystem: a rename is atomic and moves no data
+        if src_stat.st_dev == dst_dev:
+            os.rename(src, dst)
+            return
+
+        if stat.S_ISDIR(src_stat.st_mode):
+            self._copy_tree(src, dst)
+            shutil.rmtree(src)
+            self._fsync_dir(dst)
+        else:
+            self._copy_entry(src, dst, stat.S_ISLNK(src_stat.st_mode))
+            os.unlink(src)
+            self._fsync_dir(os.path.dirname(dst))
+
+    def _relative_to_workspace(self, abs_path):
+        if abs_path.startswith(self._workspace_prefix):
+            return abs_path[len(self._workspace_prefix):]
+        return os.path.relpath(abs_path, self.workspace_root)
+
+    def archive_items(self, items_to_archive, reason="General cleanup", verbose=False):
         if not items_to_archive:
             print("No items specified for archiving.")
             return
 
         archive_subdir = self._create_timestamped_archive_subdir()
         os.makedirs(archive_subdir, exist_ok=True)
+        archive_dev = os.stat(archive_subdir).st_dev
         log_file_path = os.path.join(archive_subdir, "archive_log.txt")
 
-        with open(log_file_path, "w") as log_file:
-            log_file.write(f"Archiving Session: {datetime.datetime.now()}\n")
-            log_file.write(f"Reason: {reason}\n\n")
-            log_file.write("Archived Items:\n")
+        # Collect log lines and console output and write each in one go at the end
+        log_lines = [
+            f"Archiving Session: {datetime.datetime.now()}\n",
+            f"Reason: {reason}\n\n",
+            "Archived Items:\n",
+        ]
+        messages = []
 
+        completed = False
+        try:
+            # First pass: stat every item and work out where it goes in the archive.
+            # One lstat per item answers "exists", "is it a directory" and "which device".
+            planned = []
             for item_path in items_to_archive:
                 abs_item_path = os.path.abspath(os.path.join(self.workspace_root, item_path))
-                if not os.path.exists(abs_item_path):
-                    print(f"Warning: Item not found at '{abs_item_path}'. Skipping.")
-                    log_file.write(f"- Skipped (not found): {item_path}\n")
+                try:
+                    item_stat = os.lstat(abs_item_path)
+                except FileNotFoundError:
+                    planned.append((item_path, abs_item_path, None, None))
                     continue
+                relative_path_in_archive = self._relative_to_workspace(abs_item_path)
+                planned.append((item_path, abs_item_path, item_stat, relative_path_in_archive))
 
-                relative_path_in_archive = os.path.relpath(abs_item_path, self.workspace_root)
-                destination_path = os.path.join(archive_subdir, relative_path_in_archive)
+            # Items inside another directory being archived travel with that directory,
+            # so they are logged once that directory's move has gone through
+            directory_items = [
+                (os.path.join(abs_item_path, ""), item_path)
+                for item_path, abs_item_path, item_stat, _ in planned
+                if item_stat is not None and stat.S_ISDIR(item_stat.st_mode)
+            ]
+            nested_items = {}
+            included = set()
+            for item_path, abs_item_path, item_stat, _ in planned:
+                if item_stat is None:
+                    continue
+                for prefix, directory_item in directory_items:
+                    if abs_item_path.startswith(prefix):
+                        nested_items.setdefault(directory_item, []).append((item_path, abs_item_path))
+                        included.add(item_path)
+                        break
 
-                # Ensure parent directories exist in the archive destination
-                os.makedirs(os.path.dirname(destination_path), exist_ok=True)
+            # Create each distinct parent directory in the archive once, shortest first
+            parents = {
+                os.path.dirname(os.path.join(archive_subdir, relative_path_in_archive))
+                for item_path, _, item_stat, relative_path_in_archive in planned
+                if item_stat is not None and item_path not in included
+            }
+            parents.discard(archive_subdir)
+            for parent in sorted(parents, key=len):
+                os.makedirs(parent, exist_ok=True)
 
+            # Second pass: move everything, no further directory creation needed
+            for item_path, abs_item_path, item_stat, relative_path_in_archive in planned:
+                if item_path in included:
+                    continue
+                failure = None
                 try:
-                    if os.path.isdir(abs_item_path):
-                        shutil.move(abs_item_path, destination_path)
-                        print(f"Moved directory '{item_path}' to '{destination_path}'")
-                    else:
-                        shutil.move(abs_item_path, destination_path)
-                        print(f"Moved file '{item_path}' to '{destination_path}'")
-                    log_file.write(f"- Moved: {item_path} -> {os.path.join(os.path.basename(archive_subdir), relative_path_in_archive)}\n")
+                    if item_stat is None:
+                        raise FileNotFoundError
+                    destination_path = os.path.join(archive_subdir, relative_path_in_archive)
+                    self._move_item(abs_item_path, destination_path, item_stat, archive_dev)
+                except FileNotFoundError:
+                    # Missing from the start, or removed while archiving
+                    messages.append(f"Warning: Item not found at '{abs_item_path}'. Skipping.\n")
+                    log_lines.append(f"- Skipped (not found): {item_path}\n")
+                    failure = "not found"
                 except Exception as e:
-                    print(f"Error archiving '{item_path}': {e}")
-                    log_file.write(f"- Error archiving '{item_path}': {e}\n")
-            log_file.write("\nArchiving session completed.\n")
-        print(f"\nArchiving session completed. Log saved to: {log_file_path}")
+                    messages.append(f"Error archiving '{item_path}': {e}\n")
+                    log_lines.append(f"- Error archiving '{item_path}': {e}\n")
+                    failure = str(e)
+                else:
+                    if verbose:
+                        kind = "directory" if stat.S_ISDIR(item_stat.st_mode) else "file"
+                        messages.append(f"Moved {kind} '{item_path}' to '{destination_path}'\n")
+                    log_lines.append(f"- Moved: {item_path} -> {os.path.join(os.path.basename(archive_subdir), relative_path_in_archive)}\n")
+
+                for nested_path, abs_nested_path in nested_items.pop(item_path, ()):
+                    if failure is None:
+                        if verbose:
+                            messages.append(f"Archived '{nested_path}' as part of directory '{item_path}'\n")
+                        log_lines.append(f"- Included in {item_path}: {nested_path}\n")
+                    elif failure == "not found":
+                        messages.append(f"Warning: Item not found at '{abs_nested_path}'. Skipping.\n")
+                        log_lines.append(f"- Skipped (not found): {nested_path}\n")
+                    else:
+                        messages.append(f"Error archiving '{nested_path}': directory '{item_path}' was not archived\n")
+                        log_lines.append(f"- Error archiving '{nested_path}': directory '{item_path}' was not archived\n")
+            completed = True
+        finally:
+            # Items may already have been moved, so the log is written even if
+            # something escaped the loop (a makedirs failure, Ctrl+C, ...)
+            outcome = "completed" if completed else "interrupted"
+            log_lines.append(f"\nArchiving session {outcome}.\n")
+            with open(log_file_path, "wb", buffering=0) as log_file:
+                log_file.write("".join(log_lines).encode())
+            messages.append(f"\nArchiving session {outcome}. Log saved to: {log_file_path}\n")
+            sys.stdout.write("".join(messages))
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move workspace items into a timestamped archive directory.")
+    parser.add_argument("--verbose", action="store_true", help="print every archived item")
+    args = parser.parse_args()
+
     archiver = CodeArchiver(os.getcwd()) # Assumes script is run from workspace root
     items_to_archive = [
         "server/extensions/samples/"
@@ -61,6 +209,6 @@ if __name__ == "__main__":
     # IMPORTANT: Review 'items_to_archive' carefully before running!
     # user_confirmation = input(f"Are you sure you want to archive these {len(items_to_archive)} items? (yes/no): ").lower()
     # if user_confirmation == 'yes':
-    archiver.archive_items(items_to_archive, reason="Archiving sample extensions as part of codebase cleanup.")
+    archiver.archive_items(items_to_archive, reason="Archiving sample extensions as part of codebase cleanup.", verbose=args.verbose)
     # else:
     # print("Archiving cancelled.") 
\ No newline at end of file
@@ -1,104 +1,264 @@
+import asyncio
+import json
 import os
 import platform
+import select
 import subprocess
 import socket
-import time
+from dataclasses import dataclass
+from typing import Any
 
-# Dictionary to keep track of launched app processes and their ports
-launched_apps = {}
+# Platform specifics can't change while the server runs, so resolve them once
+_PLATFORM = platform.system()
+_IS_WINDOWS = _PLATFORM == "Windows"
+if _IS_WINDOWS:
+    _SCRIPT_NAME = "run.bat"
+    _EXECUTOR = ("cmd", "/C")
+elif _PLATFORM in ("Darwin", "Linux"):
+    _SCRIPT_NAME = "run.sh"
+    _EXECUTOR = ("sh",)
+else:
+    _SCRIPT_NAME = None
+    _EXECUTOR = None
+_CREATION_FLAGS = subprocess.CREATE_NO_WINDOW if _IS_WINDOWS else 0
 
-def find_free_port(start_port=8000):
-    for port in range(start_port, 9000):
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            try:
-                s.bind(("127.0.0.1", port))
-                return port
-            except OSError:
-                continue
-    raise Exception("No free ports available between {} and {}".format(start_port, 9000))
+# Environment the apps inherit; each launch only adds its own PORT
+_BASE_ENV = os.environ.copy()
+
+# Launched app processes and their ports, keyed by app name. The entries are
+# striped across shards, each guarded by its own lock, so launching or stopping
+# one app never waits on an operation for an unrelated app.
+_STRIPES = 16
+_locks = [asyncio.Lock() for _ in range(_STRIPES)]
+_shards = [{} for _ in range(_STRIPES)]
+
+def _stripe(app_name):
+    return hash(app_name) & (_STRIPES - 1)
 
-def launch_app(app_name):
-    global launched_apps
+@dataclass(slots=True)
+class AppProc:
+    # One launched app. Slots keep the status path to plain attribute loads.
+    process: asyncio.subprocess.Process
+    port: int
+    status: str = "running"
+    exit_code: int | None = None
+    # Exit notification: a pidfd/kqueue fd registered with the event loop
+    # (-1 when unused), the kqueue that owns it, or a task awaiting the process
+    exit_fd: int = -1
+    exit_kqueue: Any = None
+    exit_task: asyncio.Task | None = None
 
-    base_path = os.path.join("apps", app_name)
-    current_platform = platform.system()
+def find_free_port():
+    # Let the kernel hand out a free ephemeral port instead of probing a range
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
 
-    script_path = None
-    command_executor = None
+def _exit_code(proc_info):
+    # Peek at the exit status without reaping the child; asyncio's child
+    # watcher still owns the actual waitpid().
+    process = proc_info.process
+    if process.returncode is None and hasattr(os, "waitid"):
+        try:
+            result = os.waitid(os.P_PID, process.pid, os.WEXITED | os.WNOHANG | os.WNOWAIT)
+        except ChildProcessError:
+            # Already reaped by asyncio's watcher, which sets returncode a little
+            # later from a loop callback; None tells the caller to wait for it
+            result = None
+        if result is not None:
+            if result.si_code == os.CLD_EXITED:
+                return result.si_status
+            return -result.si_status
+    return process.returncode
 
-    if current_platform == "Windows":
-        script_path = os.path.join(base_path, "run.bat")
-        command_executor = ["cmd", "/C"]
-    elif current_platform in ["Darwin", "Linux"]:
-        script_path = os.path.join(base_path, "run.sh")
-        command_executor = ["sh"]
+def _mark_exited(proc_info, exit_code):
+    if proc_info.status == "running":
+        proc_info.status = "exited"
+    proc_info.exit_code = exit_code
+
+def _on_exit_ready(loop, proc_info):
+    # Called by the event loop once the pidfd/kqueue becomes readable
+    fd, proc_info.exit_fd = proc_info.exit_fd, -1
+    loop.remove_reader(fd)
+    exit_code = _exit_code(proc_info)
+    if exit_code is None:
+        proc_info.exit_task = loop.create_task(_wait_exit(proc_info))
+    else:
+        _mark_exited(proc_info, exit_code)
+    kq, proc_info.exit_kqueue = proc_info.exit_kqueue, None
+    if kq is not None:
+        kq.close()
     else:
-        return {"status": "error", "message": f"Unsupported operating system: {current_platform}"}
+        os.close(fd)
+
+async def _wait_exit(proc_info):
+    _mark_exited(proc_info, await proc_info.process.wait())
+
+def _watch_exit(proc_info):
+    # Get notified of the child's exit by the event loop instead of polling it
+    # on every status request: pidfd on Linux, kqueue on macOS/BSD, and a
+    # task awaiting the process everywhere else.
+    loop = asyncio.get_running_loop()
+    pid = proc_info.process.pid
+    try:
+        if hasattr(os, "pidfd_open"):
+            proc_info.exit_fd = os.pidfd_open(pid)
+        elif hasattr(select, "kqueue"):
+            kq = select.kqueue()
+            try:
+                kq.control([select.kevent(pid, select.KQ_FILTER_PROC,
+                                          select.KQ_EV_ADD | select.KQ_EV_ONESHOT,
+                                          select.KQ_NOTE_EXIT)], 0)
+            except OSError:
+                kq.close()
+                raise
+            proc_info.exit_kqueue = kq
+            proc_info.exit_fd = kq.fileno()
+    except OSError:
+        pass # Child already gone or kernel lacks support
+
+    if proc_info.exit_fd >= 0:
+        loop.add_reader(proc_info.exit_fd, _on_exit_ready, loop, proc_info)
+    else:
+        proc_info.exit_task = loop.create_task(_wait_exit(proc_info))
+
+async def launch_app(app_name):
+    if _SCRIPT_NAME is None:
+        return {"status": "error", "message": f"Unsupported operating system: {_PLATFORM}"}
+
+    script_path = os.path.join("apps", app_name, _SCRIPT_NAME)
 
     if not os.path.exists(script_path):
         return {"status": "error", "message": f"Startup script not found for {app_name} at {script_path}"}
 
+    stripe = _stripe(app_name)
     try:
-        port = find_free_port()
-        env = os.environ.copy()
-        env["PORT"] = str(port)
-
-        # Use subprocess.Popen to launch the process in the background
-        process = subprocess.Popen(command_executor + [script_path], env=env, 
-                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, 
-                                   creationflags=subprocess.CREATE_NO_WINDOW if current_platform == "Windows" else 0)
-        
-        launched_apps[app_name] = {"process": process, "port": port, "status": "running"}
+        async with _locks[stripe]:
+            port = find_free_port()
+            env = {**_BASE_ENV, "PORT": str(port)}
+
+            # Spawn the process on the event loop so concurrent API calls keep interleaving
+            process = await asyncio.create_subprocess_exec(*_EXECUTOR, script_path, env=env,
+                                                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                                           creationflags=_CREATION_FLAGS)
+
+            proc_info = AppProc(process=process, port=port)
+            _shards[stripe][app_name] = proc_info
+            _watch_exit(proc_info)
         return {"status": "success", "message": f"{app_name} launched on port {port}"}
     except Exception as e:
         return {"status": "error", "message": f"Failed to launch {app_name}: {str(e)}"}
 
-def get_app_status(app_name):
-    if app_name in launched_apps:
-        proc_info = launched_apps[app_name]
-        if proc_info["process"].poll() is None:
-            return {"status": "running", "port": proc_info["port"]}
+async def get_app_status(app_name):
+    # A plain read never yields to the event loop, so it needs no lock
+    proc_info = _shards[_stripe(app_name)].get(app_name)
+    if proc_info is not None:
+        if proc_info.status == "running":
+            return {"status": "running", "port": proc_info.port}
         else:
             # Process has terminated
-            exit_code = proc_info["process"].poll()
-            launched_apps[app_name]["status"] = "exited"
-            return {"status": "exited", "port": proc_info["port"], "exit_code": exit_code}
+            return {"status": "exited", "port": proc_info.port, "exit_code": proc_info.exit_code}
     return {"status": "not_launched"}
 
-def stop_app(app_name):
-    if app_name in launched_apps:
-        proc_info = launched_apps[app_name]
-        if proc_info["process"].poll() is None:
-            proc_info["process"].terminate() # Try to terminate gracefully
-            time.sleep(1)
-            if proc_info["process"].poll() is None:
-                proc_info["process"].kill() # Force kill if not terminated
-            launched_apps[app_name]["status"] = "stopped"
-            return {"status": "success", "message": f"{app_name} stopped."}
-        else:
+async def stop_app(app_name):
+    stripe = _stripe(app_name)
+    async with _locks[stripe]:
+        proc_info = _shards[stripe].get(app_name)
+        if proc_info is not None:
+            process = proc_info.process
+            if proc_info.status == "running" and process.returncode is None:
+                try:
+                    process.terminate() # Try to terminate gracefully
+                except ProcessLookupError:
+                    pass # Exited and reaped since the returncode check
+                else:
+                    try:
+                        await asyncio.wait_for(process.wait(), timeout=1.0)
+                    except asyncio.TimeoutError:
+                        try:
+                            process.kill() # Force kill if not terminated
+                        except ProcessLookupError:
+                            pass
+                        await process.wait()
+                    proc_info.status = "stopped"
+                    proc_info.exit_code = process.returncode
+                    return {"status": "success", "message": f"{app_name} stopped."}
+            if proc_info.status == "running":
+                # asyncio reaped the child before the exit watcher's callback ran
+                _mark_exited(proc_info, await process.wait())
             return {"status": "not_running", "message": f"{app_name} is not running."}
     return {"status": "not_launched", "message": f"{app_name} was not launched."}
 
+# When the server runs several worker processes, the launched apps live in the
+# supervisor process only. Workers reach them through a Unix socket that carries
+# one JSON request and one JSON reply per line.
+_CONTROL_COMMANDS = {"launch": launch_app, "status": get_app_status, "stop": stop_app}
+
+async def _handle_control(reader, writer):
+    try:
+        while line := await reader.readline():
+            request = json.loads(line)
+            result = await _CONTROL_COMMANDS[request["command"]](request["app_name"])
+            writer.write(json.dumps(result).encode() + b"\n")
+            await writer.drain()
+    finally:
+        writer.close()
+
+async def serve_control(path):
+    return await asyncio.start_unix_server(_handle_control, path)
+
+class LauncherClient:
+    # Same coroutine API as this module, forwarded to the supervisor's control
+    # socket. Each call uses its own connection so a slow stop_app doesn't hold
+    # up status requests from the same worker.
+    def __init__(self, path):
+        self.path = path
+
+    async def _call(self, command, app_name):
+        reader, writer = await asyncio.open_unix_connection(self.path)
+        try:
+            writer.write(json.dumps({"command": command, "app_name": app_name}).encode() + b"\n")
+            await writer.drain()
+            line = await reader.readline()
+        finally:
+            writer.close()
+        if not line:
+            return {"status": "error", "message": "Launcher supervisor closed the connection"}
+        return json.loads(line)
+
+    async def launch_app(self, app_name):
+        return await self._call("launch", app_name)
+
+    async def get_app_status(self, app_name):
+        return await self._call("status", app_name)
+
+    async def stop_app(self, app_name):
+        return await self._call("stop", app_name)
+
 # Example of how these functions would be called (for internal testing/demonstration)
-if __name__ == "__main__":
+async def _demo():
     # These would be called via a UI or API in the final product
-    print(launch_app("TerraAgent"))
-    print(launch_app("TerraFlow"))
-    print(launch_app("TerraLevy"))
+    print(await launch_app("TerraAgent"))
+    print(await launch_app("TerraFlow"))
+    print(await launch_app("TerraLevy"))
 
     # Simulate monitoring
-    time.sleep(5)
+    await asyncio.sleep(5)
     print("--- Status after 5 seconds ---")
-    print(get_app_status("TerraAgent"))
-    print(get_app_status("TerraFlow"))
-    print(get_app_status("TerraLevy"))
+    print(await get_app_status("TerraAgent"))
+    print(await get_app_status("TerraFlow"))
+    print(await get_app_status("TerraLevy"))
 
-    time.sleep(7) # Let the scripts finish (sleep 10 in run.bat/sh)
+    await asyncio.sleep(7) # Let the scripts finish (sleep 10 in run.bat/sh)
     print("--- Status after 12 seconds (should be exited) ---")
-    print(get_app_status("TerraAgent"))
-    print(get_app_status("TerraFlow"))
-    print(get_app_status("TerraLevy"))
+    print(await get_app_status("TerraAgent"))
+    print(await get_app_status("TerraFlow"))
+    print(await get_app_status("TerraLevy"))
 
     print("--- Stopping TerraAgent ---")
-    print(stop_app("TerraAgent"))
-    print(get_app_status("TerraAgent")) 
\ No newline at end of file
+    print(await stop_app("TerraAgent"))
+    print(await get_app_status("TerraAgent"))
+
+if __name__ == "__main__":
+    asyncio.run(_demo())
@@ -4,13 +4,23 @@ Benton County Data Fetcher
 This script connects to the Benton County FTP server (ftp.spatialest.com)
 and downloads authentic property assessment data for use in the application.
 """
+import asyncio
+import errno
+import mmap
 import os
 import sys
-import ftplib
+import zlib
 import logging
-import json
 from datetime import datetime
 
+import aioftp
+import orjson
+
+try:
+    import fcntl
+except ImportError:  # Windows has no fcntl, and no O_DIRECT either
+    fcntl = None
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -21,67 +31,233 @@ logger = logging.getLogger('benton-county-fetcher')
 # Output directory for downloaded files
 OUTPUT_DIR = os.path.join(os.getcwd(), 'data', 'benton-county')
 
+# FTP server, remote data directory and number of parallel data connections
+FTP_HOST = "ftp.spatialest.com"
+FTP_DATA_DIR = '/path/to/live/data'  # Default path from the example
+MAX_CONNECTIONS = 8
+
+# Socket read size for RETR and how much data to collect before each disk write
+RECV_BLOCK_SIZE = 64 * 1024
+WRITE_BUFFER_SIZE = 1024 * 1024
+O_DIRECT = getattr(os, 'O_DIRECT', 0)
+
+class BatchedFileWriter:
+    """Collect downloaded chunks in an aligned buffer and write them to disk in bulk.
+
+    Where the platform and filesystem allow it the file is opened with O_DIRECT,
+    so full buffers go straight to disk instead of being copied through the page
+    cache first. The buffer comes from an anonymous mmap, which is page aligned
+    as O_DIRECT requires.
+    """
+
+    def __init__(self, path, buffer_size=WRITE_BUFFER_SIZE):
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0)
+        self.direct = bool(O_DIRECT)
+        try:
+            self.fd = os.open(path, flags | O_DIRECT, 0o644)
+        except OSError as e:
+            # tmpfs and some network filesystems reject O_DIRECT
+            if not self.direct or e.errno != errno.EINVAL:
+                raise
+            self.direct = False
+            self.fd = os.open(path, flags, 0o644)
+        self._mmap = mmap.mmap(-1, buffer_size)
+        self.buffer = memoryview(self._mmap)
+        self.offset = 0
+
+    def write(self, chunk):
+        """Copy a chunk into the buffer, writing out the buffer each time it fills up."""
+        chunk = memoryview(chunk)
+        while chunk:
+            size = min(len(chunk), len(self.buffer) - self.offset)
+            self.buffer[self.offset:self.offset + size] = chunk[:size]
+            self.offset += size
+            chunk = chunk[size:]
+            if self.offset == len(self.buffer):
+                self.flush()
+
+    def needs_flush(self, size):
+        """Return True if writing a chunk of the given size will fill the buffer."""
+        return self.offset + size >= len(self.buffer)
+
+    def flush(self):
+        """Write everything buffered so far with a single write call."""
+        if self.offset:
+            if self.offset % len(self.buffer):
+                # Only the tail of the file can be unaligned; finish it through the page cache
+                self._disable_direct()
+            self._write_all(self.buffer[:self.offset])
+            self.offset = 0
+
+    def close(self):
+        """Flush remaining data and close the file."""
+        if self.fd is not None:
+            try:
+                self.flush()
+            finally:
+                os.close(self.fd)
+                self.fd = None
+                self.buffer.release()
+                self._mmap.close()
+
+    def _disable_direct(self):
+        if self.direct:
+            fcntl.fcntl(self.fd, fcntl.F_SETFL, fcntl.fcntl(self.fd, fcntl.F_GETFL) & ~O_DIRECT)
+            self.direct = False
+
+    def _write_all(self, data):
+        while data:
+            try:
+                written = os.write(self.fd, data)
+            except OSError as e:
+                # A short write left the file offset unaligned
+                if not self.direct or e.errno != errno.EINVAL:
+                    raise
+                self._disable_direct()
+                continue
+            data = data[written:]
+
 def ensure_output_dir():
     """Create the output directory if it doesn't exist."""
     if not os.path.exists(OUTPUT_DIR):
         os.makedirs(OUTPUT_DIR, exist_ok=True)
         logger.info(f"Created output directory: {OUTPUT_DIR}")
 
-def connect_to_ftp():
-    """Connect to the Benton County FTP server and return the FTP object."""
+async def open_ftp_connection():
+    """Log in to the Benton County FTP server, raising if the server refuses."""
+    ftp_user = os.environ.get("FTP_USERNAME")
+    ftp_password = os.environ.get("FTP_PASSWORD")
+
+    logger.info(f"Connecting to FTP server: {FTP_HOST}")
+    client = aioftp.Client()
+    try:
+        await client.connect(FTP_HOST)
+        await client.login(ftp_user, ftp_password)
+    except BaseException:
+        client.close()
+        raise
+    logger.info("Successfully connected to FTP server.")
+
+    # Attempt to navigate to the default directory
+    try:
+        await client.change_directory(FTP_DATA_DIR)
+        logger.info("Changed to default data directory.")
+    except aioftp.StatusCodeError:
+        logger.warning("Default directory not found. Using root directory.")
+
+    return client
+
+async def connect_to_ftp():
+    """Connect to the Benton County FTP server and return a logged-in client."""
     try:
         # Get credentials from environment variables
-        ftp_host = "ftp.spatialest.com"
-        ftp_user = os.environ.get("FTP_USERNAME")
-        ftp_password = os.environ.get("FTP_PASSWORD")
-        
-        if not ftp_user or not ftp_password:
+        if not os.environ.get("FTP_USERNAME") or not os.environ.get("FTP_PASSWORD"):
             logger.error("FTP credentials not found in environment variables.")
             sys.exit(1)
             
-        # Connect to FTP server
-        logger.info(f"Connecting to FTP server: {ftp_host}")
-        ftp = ftplib.FTP(ftp_host)
-        ftp.login(ftp_user, ftp_password)
-        logger.info("Successfully connected to FTP server.")
-        
-        return ftp
+        return await open_ftp_connection()
     except Exception as e:
         logger.error(f"Failed to connect to FTP server: {str(e)}")
         sys.exit(1)
 
-def download_property_data(ftp):
-    """Download all property assessment data files from the FTP server."""
+async def close_ftp(client):
+    """Close an FTP client, ignoring errors from an already broken connection."""
+    try:
+        await client.quit()
+    except Exception:
+        client.close()
+
+async def enable_compression(client):
+    """Switch the connection to MODE Z (deflate) if the server supports it."""
     try:
-        # First, attempt to navigate to the default directory
+        await client.command("MODE Z", "200")
+        return True
+    except aioftp.StatusCodeError:
+        return False
+
+async def list_data_files(client):
+    """Return the names of the property data files in the current directory, largest first."""
+    # aioftp lists with MLSD, so each entry comes with typed facts instead of a bare name
+    entries = await client.list()
+    logger.info(f"Found {len(entries)} files on FTP server.")
+
+    # Skip directories and non-data files
+    files = [
+        (path.name, int(info.get("size", 0)))
+        for path, info in entries
+        if info.get("type") == "file"
+        and not path.name.startswith('.')
+        and path.name.endswith(('.csv', '.json', '.xml'))
+    ]
+    # Start the biggest transfers first so they don't end up running alone at the end
+    files.sort(key=lambda entry: entry[1], reverse=True)
+    return [name for name, _ in files]
+
+async def download_file(client, file, compressed=False):
+    """Stream a single file from the FTP server into OUTPUT_DIR."""
+    logger.info(f"Downloading file: {file}")
+    local_path = os.path.join(OUTPUT_DIR, file)
+    decompressor = zlib.decompressobj() if compressed else None
+
+    writer = BatchedFileWriter(local_path)
+    try:
+        async with client.download_stream(file) as stream:
+            async for block in stream.iter_by_block(RECV_BLOCK_SIZE):
+                if decompressor is not None:
+                    block = decompressor.decompress(block)
+                # Disk writes happen off the event loop so other transfers keep flowing
+                if writer.needs_flush(len(block)):
+                    await asyncio.to_thread(writer.write, block)
+                else:
+                    writer.write(block)
+        if decompressor is not None:
+            writer.write(decompressor.flush())
+    finally:
+        await asyncio.to_thread(writer.close)
+
+    logger.info(f"Successfully downloaded: {file}")
+
+async def download_worker(queue, client=None):
+    """Download files from the queue over one FTP connection until it is empty."""
+    own_client = client is None
+    if own_client:
+        # Extra connections are optional: servers often cap logins per user or
+        # IP, in which case the connections that did open drain the queue.
         try:
-            ftp.cwd('/path/to/live/data')  # Default path from the example
-            logger.info("Changed to default data directory.")
-        except ftplib.error_perm:
-            logger.warning("Default directory not found. Using root directory.")
-        
-        # List files in current directory
-        files = ftp.nlst()
-        logger.info(f"Found {len(files)} files on FTP server.")
-        
+            client = await open_ftp_connection()
+        except Exception as e:
+            logger.warning(f"Could not open an extra FTP connection, continuing with fewer: {str(e)}")
+            return
+    try:
+        compressed = await enable_compression(client)
+        while not queue.empty():
+            await download_file(client, queue.get_nowait(), compressed)
+    finally:
+        if own_client:
+            await close_ftp(client)
+
+async def download_property_data(client):
+    """Download all property assessment data files from the FTP server."""
+    try:
+        files = await list_data_files(client)
+
+        queue = asyncio.Queue()
         for file in files:
-            # Skip directories and non-data files
-            if file.startswith('.') or '.' not in file:
-                continue
-                
-            # Check for property data files
-            if file.endswith('.csv') or file.endswith('.json') or file.endswith('.xml'):
-                logger.info(f"Downloading file: {file}")
-                local_path = os.path.join(OUTPUT_DIR, file)
-                
-                with open(local_path, 'wb') as f:
-                    ftp.retrbinary(f"RETR {file}", f.write)
-                
-                logger.info(f"Successfully downloaded: {file}")
+            queue.put_nowait(file)
+
+        # Reuse the listing connection for the first worker and open one
+        # extra data connection per additional worker. The task group cancels
+        # the remaining transfers as soon as one of them fails.
+        async with asyncio.TaskGroup() as workers:
+            workers.create_task(download_worker(queue, client))
+            for _ in range(min(MAX_CONNECTIONS, len(files)) - 1):
+                workers.create_task(download_worker(queue))
         
         return True
     except Exception as e:
-        logger.error(f"Error downloading property data: {str(e)}")
+        errors = e.exceptions if isinstance(e, ExceptionGroup) else [e]
+        for error in errors:
+            logger.error(f"Error downloading property data: {str(error)}")
         return False
 
 def create_metadata():
@@ -90,28 +266,25 @@ def create_metadata():
         "source": "Benton County, Washington",
         "source_url": "ftp.spatialest.com",
         "download_date": datetime.now().isoformat(),
-        "files": os.listdir(OUTPUT_DIR)
+        "files": [entry.name for entry in os.scandir(OUTPUT_DIR)]
     }
     
     metadata_path = os.path.join(OUTPUT_DIR, 'metadata.json')
-    with open(metadata_path, 'w') as f:
-        json.dump(metadata, f, indent=2)
+    with open(metadata_path, 'wb') as f:
+        f.write(orjson.dumps(metadata, option=orjson.OPT_INDENT_2))
     
     logger.info(f"Created metadata file: {metadata_path}")
 
-def main():
+async def main():
     """Main function to fetch Benton County property data."""
     logger.info("Starting Benton County data fetch process.")
     
     ensure_output_dir()
-    ftp = connect_to_ftp()
-    success = download_property_data(ftp)
+    client = await connect_to_ftp()
+    success = await download_property_data(client)
     
-    try:
-        ftp.quit()
-        logger.info("FTP connection closed.")
-    except:
-        pass
+    await close_ftp(client)
+    logger.info("FTP connection closed.")
     
     if success:
         create_metadata()
@@ -122,4 +295,4 @@ def main():
         return False
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file